@@ -1,11 +1,40 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
 import os
 import numpy as np
 import argparse
+import sys
+import tempfile
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def parse_arguments():
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pacsv
+except ImportError:  # pyarrow is optional, fall back to the pandas parser
+    pa = None
+    pq = None
+    pacsv = None
+
+# Compact dtypes for the required columns. Hardware columns are nullable since
+# unreachable nodes leave them blank. Reachable is nullable too, a blank cell is
+# treated as not up once the file is loaded.
+DTYPES = {
+    'Node_ID': 'int32',
+    'Reachable': 'Int8',
+    'CPU_Name': 'category',
+    'Cores_Per_Socket': 'Int16',
+    'Total_CPUs': 'Int16',
+    'Total_RAM_GiB': 'Float64',
+}
+REQUIRED_COLUMNS = list(DTYPES)
+SCAN_COLUMNS = ['Node_ID', 'Reachable']  # All that older scans need for the heatmap
+DEFAULT_OUTFILE = '/tmp/example.png'
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pcunix")
+CACHE_VERSION = 4  # Bump when the cached frame layout changes
+CACHE_STAMP_KEY = b'pcunix_stamp'  # Parquet metadata key holding the CSV version
+
+def parse_arguments(argv=None):
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="Plot node uptime heatmap and analyze reachable nodes.")
     parser.add_argument(
@@ -19,34 +48,173 @@ def parse_arguments():
         default="plain",
         help="Output format for the grouped nodes table: 'plain' or 'md'/'markdown' (default: plain)"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--no-show",
+        action="store_true",
+        help="Only save the heatmap image, never open an interactive window."
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default=DEFAULT_OUTFILE,
+        help=f"Path of the heatmap PNG to write (default: {DEFAULT_OUTFILE})"
+    )
+    parser.add_argument(
+        "--fast-image",
+        action="store_true",
+        help="Write a label-free heatmap directly with Pillow instead of matplotlib."
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        help="Skip the heatmap and only print statistics for the latest scan."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Always parse the CSV files, never read or write parsed copies in {CACHE_DIR}."
+    )
+    return parser.parse_args(argv)
+
+def _cache_path(file_path, cache_dir):
+    """Return the parquet cache path for a CSV file, a single entry per absolute path."""
+    key = hashlib.blake2b(os.path.abspath(file_path).encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+def parse_csv(file_path):
+    """Parse a CSV file with PyArrow's multithreaded reader, or pandas if unavailable."""
+    if pacsv is None:
+        return pd.read_csv(file_path, usecols=lambda col: col in DTYPES, dtype=DTYPES)
+
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=1 << 20)
+    convert_options = pacsv.ConvertOptions(
+        include_columns=REQUIRED_COLUMNS,
+        strings_can_be_null=True,  # Blank CPU names are NaN, as with pandas
+        column_types={
+            'Node_ID': pa.int32(),
+            'Reachable': pa.int8(),
+            'Cores_Per_Socket': pa.int16(),
+            'Total_CPUs': pa.int16(),
+            'Total_RAM_GiB': pa.float64(),
+        }
+    )
+    try:
+        table = pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options)
+    except pa.ArrowInvalid as e:
+        if "Empty CSV file" in str(e):
+            raise pd.errors.EmptyDataError(str(e)) from e
+        raise
+    except pa.ArrowKeyError:
+        # Missing required columns, parse everything and let the caller report it
+        table = pacsv.read_csv(file_path, read_options=read_options)
+    df = table.to_pandas()
+    return df.astype({col: dtype for col, dtype in DTYPES.items() if col in df.columns})
+
+def _read_csv_cached(file_path, mtime, size, cache_dir):
+    """Read a CSV file, reusing an on-disk parquet copy while the file is unchanged.
+
+    The copy is stamped with the CSV's mtime and size, so rewriting the CSV
+    replaces its cache entry instead of leaving a stale one behind.
+    """
+    if pq is None:
+        return parse_csv(file_path)  # Parquet needs pyarrow
+
+    cache_path = _cache_path(file_path, cache_dir)
+    stamp = f"{CACHE_VERSION}|{mtime}|{size}".encode()
+    try:
+        if (pq.read_schema(cache_path).metadata or {}).get(CACHE_STAMP_KEY) == stamp:
+            return pd.read_parquet(cache_path, engine='pyarrow')
+    except Exception:
+        pass  # Missing or corrupt cache, re-parse the CSV
+
+    df = parse_csv(file_path)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), CACHE_STAMP_KEY: stamp})
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file and rename it, so concurrent or interrupted
+        # runs never leave a partial cache file behind
+        fd, tmp_path = tempfile.mkstemp(suffix='.parquet.tmp', dir=cache_dir)
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception:
+        pass  # Caching is best-effort
+    return df
+
+def read_scan_csv(file_path, cache_dir=None):
+    """Read a scan CSV, skipping the CSV parser when a fresh cached copy exists.
 
-def load_and_validate_csvs(csv_files):
+    Parsed copies are only kept on disk, under cache_dir, and caching is off
+    when it is None. Frames are not kept in memory between calls.
+    """
+    if cache_dir is None:
+        return parse_csv(file_path)
+    mtime = os.path.getmtime(file_path)
+    size = os.path.getsize(file_path)
+    return _read_csv_cached(file_path, mtime, size, cache_dir)
+
+def _load_one(file_path, keep_metadata=True, cache_dir=None):
+    """Load and validate a single CSV file, returning (label, DataFrame or None, message or None).
+
+    Without keep_metadata only the SCAN_COLUMNS are kept, dropping the hardware columns.
+    """
+    file_name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        df = read_scan_csv(file_path, cache_dir)
+        if not all(col in df.columns for col in REQUIRED_COLUMNS):
+            return file_name_without_ext, None, f"Warning: Skipping {file_path}. Missing one or more required columns: {REQUIRED_COLUMNS}."
+        df['Reachable'] = df['Reachable'].fillna(0).astype('int8')
+        if not keep_metadata:
+            df = df[SCAN_COLUMNS]
+        return file_name_without_ext, df, None
+    except FileNotFoundError:
+        message = f"Error: File not found - {file_path}"
+    except pd.errors.EmptyDataError:
+        message = f"Warning: {file_path} is empty. Skipping."
+    except Exception as e:
+        message = f"Error reading {file_path}: {e}"
+    return file_name_without_ext, None, message
+
+def load_and_validate_csvs(csv_files, cache_dir=None):
     """Load and validate CSV files, returning combined data and file labels."""
     if not csv_files:
         print("No CSV files provided. Exiting.")
         return None, None
 
+    # Files are read concurrently, the CSV parsers release the GIL. Only the
+    # latest scan is analyzed, so the older ones drop their hardware columns
+    # as soon as they are loaded.
+    results = [None] * len(csv_files)
+    last = len(csv_files) - 1
+    with ThreadPoolExecutor(max_workers=min(32, len(csv_files))) as executor:
+        futures = {
+            executor.submit(_load_one, path, keep_metadata=(i == last), cache_dir=cache_dir): i
+            for i, path in enumerate(csv_files)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    # If the last file was rejected, the latest valid scan needs its metadata back
+    if results[last][1] is None:
+        for i in range(last - 1, -1, -1):
+            if results[i][1] is not None:
+                label, df, _ = _load_one(csv_files[i], cache_dir=cache_dir)
+                results[i] = (label, df, None) if df is not None else results[i]
+                break
+
+    # Keep the original file order so scans and warnings line up chronologically
     all_data = []
     file_labels = []
-
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            required_columns = ['Node_ID', 'Reachable', 'CPU_Name', 'Cores_Per_Socket', 'Total_CPUs', 'Total_RAM_GiB']
-            if not all(col in df.columns for col in required_columns):
-                print(f"Warning: Skipping {file_path}. Missing one or more required columns: {required_columns}.")
-                continue
-            file_name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
-            df['Scan_Label'] = file_name_without_ext
+    for label, df, message in results:
+        if message is not None:
+            print(message)
+        if df is not None:
             all_data.append(df)
-            file_labels.append(file_name_without_ext)
-        except FileNotFoundError:
-            print(f"Error: File not found - {file_path}")
-        except pd.errors.EmptyDataError:
-            print(f"Warning: {file_path} is empty. Skipping.")
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
+            file_labels.append(label)
 
     if not all_data:
         print("No valid data found in the provided CSV files. Exiting.")
@@ -55,18 +223,36 @@ def load_and_validate_csvs(csv_files):
     return all_data, file_labels
 
 def process_data(all_data, file_labels):
-    """Process data into a pivot table for heatmap plotting."""
-    combined_df = pd.concat(all_data, ignore_index=True)
-    pivot_table = combined_df.pivot_table(
-        index='Node_ID',
-        columns='Scan_Label',
-        values='Reachable',
-        aggfunc='first'
-    )
-    pivot_table = pivot_table.reindex(columns=file_labels, fill_value=0)
-    pivot_table = pivot_table.sort_index(ascending=True)
+    """Process data into a node x scan reachability matrix for heatmap plotting."""
+    # np.unique returns sorted IDs, so rows can be found by binary search
+    all_nodes = np.unique(np.concatenate([df['Node_ID'].to_numpy() for df in all_data]))
+
+    # Reachable is binary, so scatter each scan straight into an int8 matrix.
+    # Column-major keeps each scan contiguous, so the latest-scan slice is a cheap view.
+    matrix = np.zeros((all_nodes.size, len(file_labels)), dtype=np.int8, order='F')
+    for j, df in enumerate(all_data):
+        rows = np.searchsorted(all_nodes, df['Node_ID'].to_numpy())
+        matrix[rows, j] = df['Reachable'].to_numpy(dtype=np.int8)
+
+    pivot_table = pd.DataFrame(matrix, index=all_nodes, columns=file_labels, copy=False)
     return pivot_table
 
+MAX_HEATMAP_ROWS = 800
+
+def downsample_rows(pivot_table, max_rows=MAX_HEATMAP_ROWS):
+    """Coarsen node rows into buckets so the heatmap is at most max_rows tall.
+
+    A bucket is shown as down if any of its nodes was down in that scan, and
+    is labelled with the first node ID it contains.
+    """
+    num_nodes = len(pivot_table.index)
+    stride = max(1, -(-num_nodes // max_rows))  # Round up so there are at most max_rows buckets
+    if stride == 1:
+        return pivot_table
+    bucket_starts = np.arange(0, num_nodes, stride)
+    values = np.minimum.reduceat(pivot_table.values, bucket_starts, axis=0)
+    return pd.DataFrame(values, index=pivot_table.index[bucket_starts], columns=pivot_table.columns)
+
 def setup_plot_dimensions(pivot_table):
     """Calculate dynamic figure dimensions based on data size."""
     num_nodes = len(pivot_table.index)
@@ -99,6 +285,11 @@ def configure_axes(ax, pivot_table, num_nodes, num_scans):
 
 def create_heatmap(pivot_table):
     """Create and configure the heatmap plot."""
+    # Imported lazily so --help and argument errors don't pay for matplotlib
+    import matplotlib.pyplot as plt
+    import matplotlib.colors as mcolors
+
+    pivot_table = downsample_rows(pivot_table)
     num_nodes = len(pivot_table.index)
     num_scans = len(pivot_table.columns)
     fig_width, fig_height = setup_plot_dimensions(pivot_table)
@@ -113,43 +304,83 @@ def create_heatmap(pivot_table):
     plt.tight_layout()
     return fig
 
+def save_figure_png(fig, file_path, dpi=150):
+    """Render the figure once on an Agg canvas and encode it to PNG with Pillow."""
+    from PIL import Image
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    # Like savefig, render on a temporary Agg canvas so any backend works and
+    # the dpi change never resizes an interactive window
+    original_canvas, original_dpi = fig.canvas, fig.dpi
+    canvas = FigureCanvasAgg(fig)
+    try:
+        fig.dpi = dpi
+        canvas.draw()
+        image = Image.fromarray(np.asarray(canvas.buffer_rgba()), mode='RGBA').convert('RGB')
+    finally:
+        fig.dpi = original_dpi
+        fig.set_canvas(original_canvas)
+    image.save(file_path, compress_level=1)
+
+def save_fast_image(pivot_table, file_path, cell_px=10):
+    """Write the reachability matrix as a bare red/green PNG without matplotlib."""
+    from PIL import Image
+
+    values = np.ascontiguousarray(downsample_rows(pivot_table).values, dtype=np.uint8)
+    image = Image.fromarray(values, mode='P')
+    image.putpalette([255, 0, 0, 0, 128, 0])  # 0 = down (red), 1 = up (green)
+    num_rows, num_scans = values.shape
+    image = image.resize((num_scans * cell_px, num_rows * cell_px), Image.NEAREST)
+    image.save(file_path, optimize=False, compress_level=1)
+
+def _runs(node_ids):
+    """Return (starts, ends) of consecutive runs in a sorted, unique int64 array."""
+    # A run ends wherever consecutive sorted IDs differ by more than one
+    breaks = np.flatnonzero(np.diff(node_ids) != 1)
+    starts = np.r_[node_ids[0], node_ids[breaks + 1]]
+    ends = np.r_[node_ids[breaks], node_ids[-1]]
+    return starts, ends
+
 def format_node_ranges(node_ids):
     """Convert a list of node IDs into a compact string with unified ranges."""
-    if not node_ids:
+    if len(node_ids) == 0:
         return ""
-    node_ids = sorted(node_ids)
-    ranges = []
-    start = node_ids[0]
-    prev = node_ids[0]
-
-    for curr in node_ids[1:] + [None]:
-        if curr is None or curr > prev + 1:
-            if start == prev:
-                ranges.append(str(start))
-            else:
-                ranges.append(f"{start}-{prev}")
-            if curr is not None:
-                start = curr
-        prev = curr if curr is not None else prev
-
+    starts, ends = _runs(np.unique(np.asarray(node_ids, dtype=np.int64)))
+    ranges = [str(start) if start == end else f"{start}-{end}" for start, end in zip(starts.tolist(), ends.tolist())]
     return ", ".join(ranges)
 
-def analyze_latest_scan(pivot_table, latest_data, output_format):
+CONFIG_COLUMNS = ['CPU_Name', 'Cores_Per_Socket', 'Total_CPUs', 'Total_RAM_GiB']
+
+def group_nodes_by_config(up_nodes_df):
+    """Group node IDs by hardware configuration with a single sort and split.
+
+    Returns a list of (config, node_ids) pairs ordered by configuration, where
+    config is a (CPU_Name, Cores_Per_Socket, Total_CPUs, Total_RAM_GiB) tuple.
+    """
+    # Like groupby, leave out nodes with an incomplete configuration
+    sorted_df = up_nodes_df.dropna(subset=CONFIG_COLUMNS).sort_values(CONFIG_COLUMNS, kind='stable')
+    if sorted_df.empty:
+        return []
+    keys = sorted_df[CONFIG_COLUMNS].to_numpy()
+    changed = (keys[1:] != keys[:-1]).any(axis=1)
+    splits = np.flatnonzero(changed) + 1
+    groups_nodes = np.split(sorted_df['Node_ID'].to_numpy(), splits)
+    group_starts = np.r_[0, splits]
+    return [(tuple(keys[start]), node_ids) for start, node_ids in zip(group_starts, groups_nodes)]
+
+def analyze_latest_scan(latest_data, output_format):
     """Analyze and print statistics for the latest scan, including grouped nodes by CPU and RAM."""
-    last_scan = pivot_table.iloc[:, -1]
-    up_nodes_percentage = (last_scan == 1).mean() * 100
+    reachable = latest_data['Reachable'].to_numpy()
+    up_mask = reachable == 1
+    up_nodes_percentage = 100.0 * np.count_nonzero(up_mask) / reachable.size
     print(f"\nPercentage of nodes up in latest scan: {up_nodes_percentage:.2f}%")
-    up_nodes = last_scan[last_scan == 1].index.tolist()
-    print(f"Nodes that are up in latest scan: {up_nodes}")
+    up_nodes = np.unique(latest_data['Node_ID'].to_numpy()[up_mask])
+    print(f"Nodes that are up in latest scan: {up_nodes.tolist()}")
 
     # Group reachable nodes by CPU and RAM configuration
-    if up_nodes:
-        up_nodes_df = latest_data[latest_data['Node_ID'].isin(up_nodes)][
-            ['Node_ID', 'CPU_Name', 'Cores_Per_Socket', 'Total_CPUs', 'Total_RAM_GiB']
-        ]
-        grouped = up_nodes_df.groupby(
-            ['CPU_Name', 'Cores_Per_Socket', 'Total_CPUs', 'Total_RAM_GiB']
-        ).agg({'Node_ID': list}).reset_index()
+    if up_nodes.size:
+        up_nodes_df = latest_data.loc[up_mask, ['Node_ID'] + CONFIG_COLUMNS]
+        grouped = group_nodes_by_config(up_nodes_df)
 
         print("\nGrouped Reachable Nodes by CPU and RAM Configuration:")
         
@@ -159,13 +390,10 @@ def analyze_latest_scan(pivot_table, latest_data, output_format):
             print("|-----------------|-----|----------------|-----------------|------------|----------|")
             
             # Markdown table rows
-            for _, row in grouped.iterrows():
-                num_nodes = len(row['Node_ID'])
-                cpu_name = row['CPU_Name'].replace("|", "\\|")  # Escape pipes for Markdown
-                cores = row['Cores_Per_Socket']
-                threads = row['Total_CPUs']
-                ram = row['Total_RAM_GiB']
-                node_ids = format_node_ranges(row['Node_ID']).replace("|", "\\|")  # Escape pipes
+            for (cpu_name, cores, threads, ram), group_node_ids in grouped:
+                num_nodes = len(group_node_ids)
+                cpu_name = cpu_name.replace("|", "\\|")  # Escape pipes for Markdown
+                node_ids = format_node_ranges(group_node_ids).replace("|", "\\|")  # Escape pipes
                 print(f"| {num_nodes} | {cpu_name} | {cores} | {threads} | {ram} | {node_ids} |")
         else:
             # Plain text table
@@ -173,33 +401,64 @@ def analyze_latest_scan(pivot_table, latest_data, output_format):
             print(f"{'Number of Nodes':<15} {'CPU':<20} {'Physical Cores':<15} {'Logical Threads':<15} {'DRAM (GiB)':<10} {'Node IDs'}")
             print("-" * 60)
 
-            for _, row in grouped.iterrows():
-                num_nodes = len(row['Node_ID'])
-                cpu_name = row['CPU_Name']
-                cores = row['Cores_Per_Socket']
-                threads = row['Total_CPUs']
-                ram = row['Total_RAM_GiB']
-                node_ids = format_node_ranges(row['Node_ID'])
+            for (cpu_name, cores, threads, ram), group_node_ids in grouped:
+                num_nodes = len(group_node_ids)
+                node_ids = format_node_ranges(group_node_ids)
                 print(f"{num_nodes:<15} {cpu_name:<20} {cores:<15} {threads:<15} {ram:<10} {node_ids}")
 
-def plot_uptime_heatmap():
+NON_INTERACTIVE_BACKENDS = ('agg', 'pdf', 'svg', 'ps', 'cairo', 'template')
+
+def should_show(no_show=False):
+    """Only open a window for interactive runs on a GUI-capable backend."""
+    if no_show or not sys.stdout.isatty():
+        return False
+    import matplotlib
+    return not matplotlib.get_backend().lower().startswith(NON_INTERACTIVE_BACKENDS)
+
+def plot_uptime_heatmap(csv_files, output_format='plain', outfile=DEFAULT_OUTFILE, show=False, fast_image=False, plot=True, cache_dir=None):
     """
     Reads CSV files and plots a heatmap visualizing node uptime evolution.
+    Parsed CSVs are cached under cache_dir when one is given.
     """
-    args = parse_arguments()
-    csv_files = args.csv_files
-    output_format = args.format
-
-    all_data, file_labels = load_and_validate_csvs(csv_files)
+    all_data, file_labels = load_and_validate_csvs(csv_files, cache_dir)
     if all_data is None or file_labels is None:
         return
 
-    pivot_table = process_data(all_data, file_labels)
-    latest_data = all_data[-1]  # Use the latest CSV file for grouping
-    fig = create_heatmap(pivot_table)
-    plt.savefig('/tmp/example.png', dpi=300, bbox_inches='tight')
-    plt.show()
-    analyze_latest_scan(pivot_table, latest_data, output_format)
+    if plot:
+        pivot_table = process_data(all_data, file_labels)
+        if fast_image:
+            save_fast_image(pivot_table, outfile)
+        else:
+            fig = create_heatmap(pivot_table)
+            save_figure_png(fig, outfile)
+            import matplotlib.pyplot as plt
+            if show:
+                plt.show()
+            else:
+                plt.close(fig)  # Don't leak a figure per call
+
+    # Statistics only need the latest CSV file, not the reachability matrix
+    analyze_latest_scan(all_data[-1], output_format)
+
+def main(argv=None):
+    """Command-line entry point."""
+    args = parse_arguments(argv)
+    # --fast-image and --no-plot never touch matplotlib, not even to check the backend
+    uses_matplotlib = not args.no_plot and not args.fast_image
+    show = uses_matplotlib and should_show(args.no_show)
+    if uses_matplotlib and not show:
+        # Nothing will be displayed, so skip initializing a GUI backend
+        import matplotlib
+        matplotlib.use('Agg')
+    plot_uptime_heatmap(
+        args.csv_files,
+        output_format=args.format,
+        outfile=args.output,
+        show=show,
+        fast_image=args.fast_image,
+        plot=not args.no_plot,
+        cache_dir=None if args.no_cache else CACHE_DIR
+    )
 
 if __name__ == "__main__":
-    plot_uptime_heatmap()
\ No newline at end of file
+    main()